@@ -15,7 +15,11 @@
 
 """TFClient provides tf-ops for interacting with Reverb."""
 
-from typing import Any, List, Optional, Union
+import collections
+import functools
+import heapq
+import types
+from typing import Any, List, Optional, Sequence, Tuple, Union
 
 from reverb import client as reverb_client
 from reverb import replay_sample
@@ -23,6 +27,56 @@ import tensorflow.compat.v1 as tf
 import tree
 
 from reverb.cc.ops import gen_dataset_op
+from tensorflow.python.util import tf_inspect  # pylint: disable=g-direct-tensorflow-import
+
+# True if the runtime is executing with TF1.0 APIs.
+# TODO(b/145023272): Update when/if there is a better way.
+_IS_TF1 = hasattr(tf, 'to_float')
+
+# Arguments of `gen_dataset_op.reverb_dataset` in the order of the generated
+# wrapper: inputs, attrs without defaults and then attrs with defaults.
+_OP_ARG_NAMES = (
+    'server_address',
+    'table',
+    'dtypes',
+    'shapes',
+    'sequence_length',
+    'emit_timesteps',
+    'max_in_flight_samples_per_worker',
+    'num_workers_per_iterator',
+    'max_samples_per_stream',
+    'rate_limiter_timeout_ms',
+    'flexible_batch_size',
+)
+
+# Passing the arguments positionally avoids the keyword binding of every call.
+# Fall back to keywords if the op signature ever drifts from `_OP_ARG_NAMES`.
+_OP_ACCEPTS_POSITIONAL_ARGS = tuple(
+    tf_inspect.getfullargspec(gen_dataset_op.reverb_dataset)
+    .args[:len(_OP_ARG_NAMES)]) == _OP_ARG_NAMES
+
+# Predicate and requirement of each sampler argument of `ReplayDataset`.
+_ARG_CHECKS = {
+    'max_in_flight_samples_per_worker': (lambda v: v >= 1,
+                                         'must be a positive integer'),
+    'num_workers_per_iterator': (lambda v: v >= 1 or v == -1,
+                                 'must be a positive integer or -1'),
+    'max_samples_per_stream': (lambda v: v >= 1 or v == -1,
+                               'must be a positive integer or -1'),
+    'sequence_length': (lambda v: v is None or v >= 1,
+                        'must be None or a positive integer'),
+    'rate_limiter_timeout_ms': (lambda v: v >= -1, 'must be an integer >= -1'),
+    'flexible_batch_size': (lambda v: v >= 1 or v == -1,
+                            'must be a positive integer or -1'),
+}
+
+# Maximum number of table names listed when a table can't be found.
+_MAX_TABLE_NAMES_IN_ERROR = 32
+
+# Dtypes of the `SampleInfo` fields and the shape of each field when timesteps
+# are emitted.
+_SAMPLE_INFO_DTYPES = replay_sample.SampleInfo.tf_dtypes()
+_EMPTY_SHAPE = tf.TensorShape([])
 
 
 class ReplayDataset(tf.data.Dataset):
@@ -47,6 +101,27 @@ class ReplayDataset(tf.data.Dataset):
   This allows for items of arbitrary length to be streamed with limited memory.
   """
 
+  # Note that `tf.data.Dataset` doesn't declare `__slots__` so instances still
+  # have a `__dict__` (which the base class relies on). The slots only turn
+  # lookups of the attributes below into slot reads.
+  __slots__ = (
+      '_server_address',
+      '_table',
+      '_dtypes',
+      '_shapes',
+      '_sequence_length',
+      '_emit_timesteps',
+      '_max_in_flight_samples_per_worker',
+      '_num_workers_per_iterator',
+      '_max_samples_per_stream',
+      '_rate_limiter_timeout_ms',
+      '_flexible_batch_size',
+      '_flat_spec_dtypes',
+      '_flat_spec_shapes',
+      '_cached_element_spec',
+      '_make_variant',
+  )
+
   def __init__(self,
                server_address: Union[str, tf.Tensor],
                table: Union[str, tf.Tensor],
@@ -58,7 +133,8 @@ class ReplayDataset(tf.data.Dataset):
                sequence_length: Optional[int] = None,
                emit_timesteps: bool = True,
                rate_limiter_timeout_ms: int = -1,
-               flexible_batch_size: int = -1):
+               flexible_batch_size: int = -1,
+               _skip_validation: bool = False):
     """Constructs a new ReplayDataset.
 
     Args:
@@ -107,7 +183,9 @@ class ReplayDataset(tf.data.Dataset):
         Larger `flexible_batch_size` values result a bias towards sampling over
         inserts. In highly overloaded systems this results in higher sample QPS
         and lower insert QPS compared to lower `flexible_batch_size` values.
-
+      _skip_validation: (Internal) If set, the structure of `dtypes` and
+        `shapes` and their leading dimensions are assumed to be valid. Only
+        intended for trusted callers such as `from_table_signature`.
 
     Raises:
       ValueError: If `dtypes` and `shapes` don't share the same structure.
@@ -121,73 +199,117 @@ class ReplayDataset(tf.data.Dataset):
       ValueError: If `rate_limiter_timeout_ms < -1`.
       ValueError: If `flexible_batch_size` is not a positive integer or -1.
     """
-    tree.assert_same_structure(dtypes, shapes, False)
-    if max_in_flight_samples_per_worker < 1:
-      raise ValueError(
-          'max_in_flight_samples_per_worker (%d) must be a positive integer' %
-          max_in_flight_samples_per_worker)
-    if num_workers_per_iterator < 1 and num_workers_per_iterator != -1:
-      raise ValueError(
-          'num_workers_per_iterator (%d) must be a positive integer or -1' %
-          num_workers_per_iterator)
-    if max_samples_per_stream < 1 and max_samples_per_stream != -1:
-      raise ValueError(
-          'max_samples_per_stream (%d) must be a positive integer or -1' %
-          max_samples_per_stream)
-    if sequence_length is not None and sequence_length < 1:
-      raise ValueError(
-          'sequence_length (%s) must be None or a positive integer' %
-          sequence_length)
-    if rate_limiter_timeout_ms < -1:
-      raise ValueError('rate_limiter_timeout_ms (%d) must be an integer >= -1' %
-                       rate_limiter_timeout_ms)
-    if flexible_batch_size < 1 and flexible_batch_size != -1:
-      raise ValueError(
-          'flexible_batch_size (%d) must be a positive integer or -1' %
-          flexible_batch_size)
-
-    # Add the info fields.
-    dtypes = replay_sample.ReplaySample(replay_sample.SampleInfo.tf_dtypes(),
-                                        dtypes)
-    shapes = replay_sample.ReplaySample(
-        replay_sample.SampleInfo(
-            tf.TensorShape([sequence_length] if not emit_timesteps else []),
-            tf.TensorShape([sequence_length] if not emit_timesteps else []),
-            tf.TensorShape([sequence_length] if not emit_timesteps else []),
-            tf.TensorShape([sequence_length] if not emit_timesteps else [])),
-        shapes)
+    if not _skip_validation:
+      tree.assert_same_structure(dtypes, shapes, False)
+    _validate_sampler_args(
+        max_in_flight_samples_per_worker=max_in_flight_samples_per_worker,
+        num_workers_per_iterator=num_workers_per_iterator,
+        max_samples_per_stream=max_samples_per_stream,
+        sequence_length=sequence_length,
+        rate_limiter_timeout_ms=rate_limiter_timeout_ms,
+        flexible_batch_size=flexible_batch_size)
 
     # If sequences are to be emitted then all shapes must specify use
     # sequence_length as their batch dimension.
-    if not emit_timesteps:
-
-      def _validate_batch_dim(path: str, shape: tf.TensorShape):
-        if (not shape.ndims
-            or tf.compat.dimension_value(shape[0]) != sequence_length):
-          raise ValueError(
-              'All items in shapes must use sequence_range (%s) as the leading '
-              'dimension, but "%s" has shape %s' %
-              (sequence_length, path[0], shape))
-
-      tree.map_structure_with_path(_validate_batch_dim, shapes.data)
+    flat_shapes = tuple(tree.flatten(shapes))
+    if not emit_timesteps and not _skip_validation:
+      _validate_batch_dim(shapes, flat_shapes, sequence_length)
 
     # The tf.data API doesn't fully support lists so we convert all uses of
     # lists into tuples.
     dtypes = _convert_lists_to_tuples(dtypes)
     shapes = _convert_lists_to_tuples(shapes)
 
+    self._init_core(
+        server_address=server_address,
+        table=table,
+        dtypes=dtypes,
+        shapes=shapes,
+        flat_dtypes=tuple(tree.flatten(dtypes)),
+        flat_shapes=flat_shapes,
+        max_in_flight_samples_per_worker=max_in_flight_samples_per_worker,
+        num_workers_per_iterator=num_workers_per_iterator,
+        max_samples_per_stream=max_samples_per_stream,
+        sequence_length=sequence_length,
+        emit_timesteps=emit_timesteps,
+        rate_limiter_timeout_ms=rate_limiter_timeout_ms,
+        flexible_batch_size=flexible_batch_size)
+
+  def _init_core(self, server_address: Union[str, tf.Tensor],
+                 table: Union[str, tf.Tensor], dtypes: Any, shapes: Any,
+                 flat_dtypes: Tuple[tf.DType, ...],
+                 flat_shapes: Tuple[tf.TensorShape, ...],
+                 max_in_flight_samples_per_worker: int,
+                 num_workers_per_iterator: int, max_samples_per_stream: int,
+                 sequence_length: Optional[int], emit_timesteps: bool,
+                 rate_limiter_timeout_ms: int, flexible_batch_size: int):
+    """Initializes the dataset from validated specs without any lists.
+
+    Args:
+      server_address: See __init__ for details.
+      table: See __init__ for details.
+      dtypes: Dtypes of the data output. Must not contain any lists.
+      shapes: Shapes of the data output. Must not contain any lists.
+      flat_dtypes: `dtypes` flattened.
+      flat_shapes: `shapes` flattened.
+      max_in_flight_samples_per_worker: See __init__ for details.
+      num_workers_per_iterator: See __init__ for details.
+      max_samples_per_stream: See __init__ for details.
+      sequence_length: See __init__ for details.
+      emit_timesteps: See __init__ for details.
+      rate_limiter_timeout_ms: See __init__ for details.
+      flexible_batch_size: See __init__ for details.
+    """
+    # Add the info fields.
+    info_dtypes = _SAMPLE_INFO_DTYPES
+    info_shape = (
+        _EMPTY_SHAPE if emit_timesteps else tf.TensorShape([sequence_length]))
+    info_shapes = replay_sample.SampleInfo(info_shape, info_shape, info_shape,
+                                           info_shape)
+
     self._server_address = server_address
     self._table = table
-    self._dtypes = dtypes
-    self._shapes = shapes
+    self._dtypes = replay_sample.ReplaySample(info_dtypes, dtypes)
+    self._shapes = replay_sample.ReplaySample(info_shapes, shapes)
     self._sequence_length = sequence_length
     self._emit_timesteps = emit_timesteps
     self._max_in_flight_samples_per_worker = max_in_flight_samples_per_worker
     self._num_workers_per_iterator = num_workers_per_iterator
     self._max_samples_per_stream = max_samples_per_stream
     self._rate_limiter_timeout_ms = rate_limiter_timeout_ms
+    self._flexible_batch_size = flexible_batch_size
+
+    # The flattened specs and the element spec only depend on the (immutable)
+    # `dtypes` and `shapes` so compute them once rather than on every call.
+    self._flat_spec_dtypes = tuple(info_dtypes) + tuple(flat_dtypes)
+    self._flat_spec_shapes = tuple(info_shapes) + tuple(flat_shapes)
+    self._cached_element_spec = tree.map_structure(tf.TensorSpec, self._shapes,
+                                                   self._dtypes)
+
+    # All arguments of the op are fixed at construction so bind them once.
+    op_args = (
+        self._server_address,
+        self._table,
+        self._flat_spec_dtypes,
+        self._flat_spec_shapes,
+        self._sequence_length or -1,
+        self._emit_timesteps,
+        self._max_in_flight_samples_per_worker,
+        self._num_workers_per_iterator,
+        self._max_samples_per_stream,
+        self._rate_limiter_timeout_ms,
+        self._flexible_batch_size,
+    )
+    if _OP_ACCEPTS_POSITIONAL_ARGS:
+      self._make_variant = functools.partial(gen_dataset_op.reverb_dataset,
+                                             *op_args)
+    else:
+      self._make_variant = functools.partial(
+          gen_dataset_op.reverb_dataset, **dict(zip(_OP_ARG_NAMES, op_args)))
 
-    if _is_tf1_runtime():
+    # Note that the variant tensor can't be created lazily: DatasetV1.__init__
+    # calls `_as_variant_tensor` itself and DatasetV2 requires the tensor.
+    if _IS_TF1:
       # Disabling to avoid errors given the different tf.data.Dataset init args
       # between v1 and v2 APIs.
       # pytype: disable=wrong-arg-count
@@ -214,6 +336,11 @@ class ReplayDataset(tf.data.Dataset):
     Note: The signature must be provided to `Table` at construction. See
     `Table.__init__` (./server.py) for more details.
 
+    Note: Signatures are cached per (`server_address`, `table`) so only the
+    first call for a table requires a round-trip to the server. Call
+    `reset_signature_cache` if a server is restarted at the same address with
+    a different signature.
+
     Args:
       server_address: Address of gRPC ReverbService.
       table: Table to read the signature and sample from.
@@ -239,19 +366,8 @@ class ReplayDataset(tf.data.Dataset):
         exceeded.
       ValueError: See __init__.
     """
-    client = reverb_client.Client(server_address)
-    info = client.server_info(get_signature_timeout_secs)
-    if table not in info:
-      raise ValueError(
-          f'Server at {server_address} does not contain any table named '
-          f'{table}. Found: {", ".join(sorted(info.keys()))}.')
-
-    if not info[table].signature:
-      raise ValueError(
-          f'Table {table} at {server_address} does not have a signature.')
-
-    shapes = tree.map_structure(lambda x: x.shape, info[table].signature)
-    dtypes = tree.map_structure(lambda x: x.dtype, info[table].signature)
+    shapes, dtypes = _fetch_signature(server_address, table,
+                                      get_signature_timeout_secs)
 
     if not emit_timesteps:
       batch_dim = tf.TensorShape([sequence_length])
@@ -268,36 +384,214 @@ class ReplayDataset(tf.data.Dataset):
         sequence_length=sequence_length,
         emit_timesteps=emit_timesteps,
         rate_limiter_timeout_ms=rate_limiter_timeout_ms,
+        flexible_batch_size=flexible_batch_size,
+        # Both specs are derived from the same signature and `sequence_length`
+        # was prepended to every shape above so there is nothing to validate.
+        _skip_validation=True)
+
+  @classmethod
+  def from_flat_spec(cls,
+                     server_address: Union[str, tf.Tensor],
+                     table: Union[str, tf.Tensor],
+                     flat_dtypes: Sequence[tf.DType],
+                     flat_shapes: Sequence[tf.TensorShape],
+                     max_in_flight_samples_per_worker: int,
+                     num_workers_per_iterator: int = -1,
+                     max_samples_per_stream: int = -1,
+                     sequence_length: Optional[int] = None,
+                     emit_timesteps: bool = True,
+                     rate_limiter_timeout_ms: int = -1,
+                     flexible_batch_size: int = -1):
+    """Constructs a ReplayDataset from flat sequences of dtypes and shapes.
+
+    Equivalent to calling __init__ with `tuple(flat_dtypes)` and
+    `tuple(flat_shapes)` but skips the (nested) structure handling, which is
+    useful when the specs are already available in flat form.
+
+    Args:
+      server_address: See __init__ for details.
+      table: See __init__ for details.
+      flat_dtypes: Flat sequence of dtypes of the data output.
+      flat_shapes: Flat sequence of `tf.TensorShape` of the data output.
+      max_in_flight_samples_per_worker: See __init__ for details.
+      num_workers_per_iterator: See __init__ for details.
+      max_samples_per_stream: See __init__ for details.
+      sequence_length: See __init__ for details.
+      emit_timesteps: See __init__ for details.
+      rate_limiter_timeout_ms: See __init__ for details.
+      flexible_batch_size: See __init__ for details.
+
+    Returns:
+      ReplayDataset where the `data` of each sample is a flat tuple.
+
+    Raises:
+      ValueError: If `flat_dtypes` and `flat_shapes` have different lengths.
+      ValueError: See __init__.
+    """
+    flat_dtypes = tuple(flat_dtypes)
+    flat_shapes = tuple(flat_shapes)
+    if len(flat_dtypes) != len(flat_shapes):
+      raise ValueError(
+          f'flat_dtypes ({len(flat_dtypes)}) and flat_shapes '
+          f'({len(flat_shapes)}) must have the same length.')
+    _validate_sampler_args(
+        max_in_flight_samples_per_worker=max_in_flight_samples_per_worker,
+        num_workers_per_iterator=num_workers_per_iterator,
+        max_samples_per_stream=max_samples_per_stream,
+        sequence_length=sequence_length,
+        rate_limiter_timeout_ms=rate_limiter_timeout_ms,
+        flexible_batch_size=flexible_batch_size)
+    if not emit_timesteps:
+      _validate_batch_dim(flat_shapes, flat_shapes, sequence_length)
+
+    dataset = cls.__new__(cls)
+    dataset._init_core(  # pylint: disable=protected-access
+        server_address=server_address,
+        table=table,
+        dtypes=flat_dtypes,
+        shapes=flat_shapes,
+        flat_dtypes=flat_dtypes,
+        flat_shapes=flat_shapes,
+        max_in_flight_samples_per_worker=max_in_flight_samples_per_worker,
+        num_workers_per_iterator=num_workers_per_iterator,
+        max_samples_per_stream=max_samples_per_stream,
+        sequence_length=sequence_length,
+        emit_timesteps=emit_timesteps,
+        rate_limiter_timeout_ms=rate_limiter_timeout_ms,
         flexible_batch_size=flexible_batch_size)
+    return dataset
 
   def _as_variant_tensor(self):
-    return gen_dataset_op.reverb_dataset(
-        server_address=self._server_address,
-        table=self._table,
-        dtypes=tree.flatten(self._dtypes),
-        shapes=tree.flatten(self._shapes),
-        emit_timesteps=self._emit_timesteps,
-        sequence_length=self._sequence_length or -1,
-        max_in_flight_samples_per_worker=self._max_in_flight_samples_per_worker,
-        num_workers_per_iterator=self._num_workers_per_iterator,
-        max_samples_per_stream=self._max_samples_per_stream,
-        rate_limiter_timeout_ms=self._rate_limiter_timeout_ms)
+    return self._make_variant()
 
   def _inputs(self) -> List[Any]:
     return []
 
   @property
   def element_spec(self) -> Any:
-    return tree.map_structure(tf.TensorSpec, self._shapes, self._dtypes)
+    # Built once in `_init_core`. `functools.cached_property` isn't used as it
+    # requires Python 3.8 and the package still supports 3.6 and 3.7.
+    return self._cached_element_spec
+
+
+def _validate_sampler_args(**args: Any):
+  """Raises ValueError if any of the `ReplayDataset` arguments are invalid.
+
+  Args:
+    **args: Sampler arguments of `ReplayDataset` keyed by their name in
+      `_ARG_CHECKS`.
+  """
+  for name, value in args.items():
+    is_valid, requirement = _ARG_CHECKS[name]
+    if not is_valid(value):
+      raise ValueError('%s (%s) %s' % (name, value, requirement))
+
+
+def _validate_batch_dim(shapes: Any, flat_shapes: Sequence[tf.TensorShape],
+                        sequence_length: Optional[int]):
+  """Raises ValueError if not all `shapes` lead with `sequence_length`.
+
+  Args:
+    shapes: (Nested) structure of shapes.
+    flat_shapes: `shapes` flattened.
+    sequence_length: Expected size of the leading dimension of every shape.
+
+  Raises:
+    ValueError: If any shape is a scalar or has a leading dimension other than
+      `sequence_length`.
+  """
+  for i, shape in enumerate(flat_shapes):
+    if (not shape.ndims
+        or tf.compat.dimension_value(shape[0]) != sequence_length):
+      # The path is only needed for the error message so only build it here.
+      path = tree.flatten_with_path(shapes)[i][0]
+      raise ValueError(
+          'All items in shapes must use sequence_range (%s) as the leading '
+          'dimension, but "%s" has shape %s' %
+          (sequence_length, path[0] if path else '', shape))
+
+
+@functools.lru_cache(maxsize=64)
+def _fetch_signature(server_address: str, table: str,
+                     timeout: Optional[int]) -> Tuple[Any, Any]:
+  """Fetches the signature of `table` and splits it into (shapes, dtypes)."""
+  client = reverb_client.Client(server_address)
+  info = client.server_info(timeout)
+  if table not in info:
+    # Servers can have a large number of tables so only list the first few.
+    names = heapq.nsmallest(_MAX_TABLE_NAMES_IN_ERROR, info.keys())
+    suffix = (f' (+{len(info) - len(names)} more)'
+              if len(info) > len(names) else '')
+    raise ValueError(
+        f'Server at {server_address} does not contain any table named '
+        f'{table}. Found: {", ".join(names)}{suffix}.')
+
+  if not info[table].signature:
+    raise ValueError(
+        f'Table {table} at {server_address} does not have a signature.')
+
+  # Flatten the signature once and rebuild both structures from the leaves
+  # rather than walking the signature once per output structure.
+  signature = info[table].signature
+  flat_specs = tree.flatten(signature)
+  shapes = tree.unflatten_as(signature, [spec.shape for spec in flat_specs])
+  dtypes = tree.unflatten_as(signature, [spec.dtype for spec in flat_specs])
+  return shapes, dtypes
+
+
+def reset_signature_cache():
+  """Clears the table signatures cached by `from_table_signature`."""
+  _fetch_signature.cache_clear()
 
 
 def _convert_lists_to_tuples(structure: Any) -> Any:
-  list_to_tuple_fn = lambda s: tuple(s) if isinstance(s, list) else s
-  # Traverse depth-first, bottom-up
-  return tree.traverse(list_to_tuple_fn, structure, top_down=False)
+  """Returns `structure` with all (nested) lists replaced by tuples.
+
+  Subtrees which don't contain any lists are returned as is (i.e not copied).
+
+  Args:
+    structure: Arbitrarily nested structure of lists, tuples, namedtuples,
+      mappings and attrs classes.
+
+  Returns:
+    `structure` with all lists converted into tuples.
+  """
+  if isinstance(structure, list):
+    return tuple(_convert_lists_to_tuples(s) for s in structure)
+
+  if isinstance(structure, tuple):
+    converted = [_convert_lists_to_tuples(s) for s in structure]
+    if all(a is b for a, b in zip(converted, structure)):
+      return structure
+    if hasattr(structure, '_fields'):
+      # Namedtuples have to be constructed from positional arguments.
+      return type(structure)(*converted)
+    return tuple(converted)
+
+  if isinstance(structure, collections.abc.Mapping):
+    converted = {k: _convert_lists_to_tuples(v) for k, v in structure.items()}
+    if all(converted[k] is v for k, v in structure.items()):
+      return structure
+    # Rebuild the mapping the same way as `tree` does.
+    items = ((k, converted[k]) for k in structure)
+    if isinstance(structure, collections.defaultdict):
+      return type(structure)(structure.default_factory, items)
+    if isinstance(structure, types.MappingProxyType):
+      return types.MappingProxyType(dict(items))
+    return type(structure)(items)
+
+  # `tree` also traverses attrs classes (in field order).
+  attrs_fields = getattr(type(structure), '__attrs_attrs__', None)
+  if attrs_fields is not None:
+    values = [getattr(structure, field.name) for field in attrs_fields]
+    converted = [_convert_lists_to_tuples(v) for v in values]
+    if all(a is b for a, b in zip(converted, values)):
+      return structure
+    return type(structure)(*converted)
+
+  return structure
 
 
 def _is_tf1_runtime() -> bool:
   """Returns True if the runtime is executing with TF1.0 APIs."""
-  # TODO(b/145023272): Update when/if there is a better way.
-  return hasattr(tf, 'to_float')
+  return _IS_TF1
@@ -15,6 +15,11 @@
 
 """Tests for dataset."""
 
+import atexit
+import collections
+from concurrent import futures
+import functools
+import re
 import threading
 import time
 
@@ -33,43 +38,115 @@ import tree
 from tensorflow.python.framework import tensor_spec  # pylint:disable=g-direct-tensorflow-import
 
 
+# Specs shared by many of the tests below.
+_F32 = (tf.float32,)
+_SHAPE_3X3 = (tf.TensorShape([3, 3]),)
+_SHAPE_81X81 = (tf.TensorShape([81, 81]),)
+
+# Tables which are reset after every test.
+_TABLES = ('dist', 'signatured', 'bounded_spec_signatured')
+
+# Tables with the same configuration as `_TABLES` which are populated once (by
+# `ReplayDatasetTest._populate_replay` with its default arguments) and never
+# reset. Only used by tests which don't write any data of their own.
+_POPULATED_TABLES = tuple('populated_' + table for table in _TABLES)
+
+
+# Comfortably above the number of items any test writes to a single table (at
+# most 199 by `ReplayDatasetTest._populate_replay`, which creates an item every
+# 5th of its 1000 steps once `sequence_length` steps have been written).
+_MAX_TABLE_SIZE = 2048
+
+
+def _assert_array_equal(x, y):
+  """Cheaper `np.testing.assert_array_equal` for arrays which are equal."""
+  # Only build the detailed error message if the arrays actually differ.
+  if not np.array_equal(x, y):
+    np.testing.assert_array_equal(x, y)
+
+
+def _make_tables(dist, signatured, bounded_spec_signatured):
+  return [
+      reverb_server.Table(
+          dist,
+          sampler=item_selectors.Prioritized(priority_exponent=1),
+          remover=item_selectors.Fifo(),
+          max_size=_MAX_TABLE_SIZE,
+          rate_limiter=rate_limiters.MinSize(1)),
+      reverb_server.Table(
+          signatured,
+          sampler=item_selectors.Prioritized(priority_exponent=1),
+          remover=item_selectors.Fifo(),
+          max_size=_MAX_TABLE_SIZE,
+          rate_limiter=rate_limiters.MinSize(1),
+          signature=tf.TensorSpec(dtype=tf.float32, shape=(None, None))),
+      reverb_server.Table(
+          bounded_spec_signatured,
+          sampler=item_selectors.Prioritized(priority_exponent=1),
+          remover=item_selectors.Fifo(),
+          max_size=_MAX_TABLE_SIZE,
+          rate_limiter=rate_limiters.MinSize(1),
+          # Currently only the `shape` and `dtype` of the bounded spec
+          # is considered during signature check.
+          # TODO(b/158033101): Check the boundaries as well.
+          signature=tensor_spec.BoundedTensorSpec(
+              dtype=tf.float32,
+              shape=(None, None),
+              minimum=(0.0, 0.0),
+              maximum=(10.0, 10.)),
+      ),
+  ]
+
+
 def make_server():
   return reverb_server.Server(
-      tables=[
-          reverb_server.Table(
-              'dist',
-              sampler=item_selectors.Prioritized(priority_exponent=1),
-              remover=item_selectors.Fifo(),
-              max_size=1000000,
-              rate_limiter=rate_limiters.MinSize(1)),
-          reverb_server.Table(
-              'signatured',
-              sampler=item_selectors.Prioritized(priority_exponent=1),
-              remover=item_selectors.Fifo(),
-              max_size=1000000,
-              rate_limiter=rate_limiters.MinSize(1),
-              signature=tf.TensorSpec(dtype=tf.float32, shape=(None, None))),
-          reverb_server.Table(
-              'bounded_spec_signatured',
-              sampler=item_selectors.Prioritized(priority_exponent=1),
-              remover=item_selectors.Fifo(),
-              max_size=1000000,
-              rate_limiter=rate_limiters.MinSize(1),
-              # Currently only the `shape` and `dtype` of the bounded spec
-              # is considered during signature check.
-              # TODO(b/158033101): Check the boundaries as well.
-              signature=tensor_spec.BoundedTensorSpec(
-                  dtype=tf.float32,
-                  shape=(None, None),
-                  minimum=(0.0, 0.0),
-                  maximum=(10.0, 10.)),
-          ),
-      ],
+      tables=_make_tables(*_TABLES) + _make_tables(*_POPULATED_TABLES),
       port=None,
   )
 
 
-class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
+# Signatures of the tables of `_signature_server`.
+_SIGNATURES = {
+    'signatured': {
+        'a': {
+            'b': tf.TensorSpec([3, 3], tf.float32),
+            'c': tf.TensorSpec([], tf.int64),
+        },
+        'x': tf.TensorSpec([None], tf.uint64),
+    },
+    'bounded_spec_signatured': {
+        'a': {
+            'b': tensor_spec.BoundedTensorSpec([3, 3], tf.float32, 0, 3),
+            'c': tensor_spec.BoundedTensorSpec([], tf.int64, 0, 5),
+        },
+    },
+    'sequence_signatured': {
+        'a': {
+            'b': tf.TensorSpec([3, 3], tf.float32),
+            'c': tf.TensorSpec([], tf.int64),
+        },
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _signature_server():
+  """Returns a server shared by all tests which only read table signatures.
+
+  Every test uses its own table so the server can safely be reused. It is
+  stopped when the test process exits.
+  """
+  server = reverb_server.Server(
+      [reverb_server.Table.queue('no_signature', 10)] + [
+          reverb_server.Table.queue(name, 10, signature=signature)
+          for name, signature in _SIGNATURES.items()
+      ])
+  atexit.register(server.stop)
+  return server
+
+
+class _ServerMixin:
+  """Starts a server (see `make_server`) shared by all tests of the class."""
 
   @classmethod
   def setUpClass(cls):
@@ -77,37 +154,15 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     cls._server = make_server()
     cls._client = client.Client(f'localhost:{cls._server.port}')
 
-  def tearDown(self):
-    super().tearDown()
-    self._client.reset('dist')
-    self._client.reset('signatured')
-    self._client.reset('bounded_spec_signatured')
-
   @classmethod
   def tearDownClass(cls):
     super().tearDownClass()
     cls._server.stop()
 
-  def _populate_replay(self, sequence_length=100, max_time_steps=None):
-    max_time_steps = max_time_steps or sequence_length
-    with self._client.writer(max_time_steps) as writer:
-      for i in range(1000):
-        writer.append([np.zeros((3, 3), dtype=np.float32)])
-        if i % 5 == 0 and i >= sequence_length:
-          writer.create_item(
-              table='dist', num_timesteps=sequence_length, priority=1)
-          writer.create_item(
-              table='signatured', num_timesteps=sequence_length, priority=1)
-          writer.create_item(
-              table='bounded_spec_signatured',
-              num_timesteps=sequence_length,
-              priority=1)
 
-  def _sample_from(self, dataset, num_samples):
-    iterator = dataset.make_initializable_iterator()
-    dataset_item = iterator.get_next()
-    self.evaluate(iterator.initializer)
-    return [self.evaluate(dataset_item) for _ in range(num_samples)]
+class SamplerParameterValidationTest(_ServerMixin, tf.test.TestCase,
+                                     parameterized.TestCase):
+  """Tests which only construct datasets and thus never reset any tables."""
 
   @parameterized.named_parameters(
       {
@@ -175,8 +230,8 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
       },
   )
   def test_sampler_parameter_validation(self, **kwargs):
-    dtypes = (tf.float32,)
-    shapes = (tf.TensorShape([3, 3]),)
+    dtypes = _F32
+    shapes = _SHAPE_3X3
 
     if 'max_in_flight_samples_per_worker' not in kwargs:
       kwargs['max_in_flight_samples_per_worker'] = 100
@@ -190,14 +245,96 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
       reverb_dataset.ReplayDataset(self._client.server_address, 'dist', dtypes,
                                    shapes, **kwargs)
 
-  def test_iterate(self):
-    self._populate_replay()
 
+class ReplayDatasetTest(_ServerMixin, tf.test.TestCase,
+                        parameterized.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    super().setUpClass()
+    cls._populate_replay(tables=_POPULATED_TABLES)
+    # The tables are independent so they can be reset concurrently.
+    cls._reset_pool = futures.ThreadPoolExecutor(max_workers=len(_TABLES))
+
+    # Split the CPU into 4 virtual devices for `test_distribution_strategy`.
+    # This has to happen before the TF runtime is initialized so do it once
+    # here rather than in the test.
+    physical_devices = tf.config.list_physical_devices('CPU')
+    configs = tf.config.experimental.get_virtual_device_configuration(
+        physical_devices[0])
+    if configs is None:
+      virtual_devices = [tf.config.experimental.VirtualDeviceConfiguration()
+                         for _ in range(4)]
+      tf.config.experimental.set_virtual_device_configuration(
+          physical_devices[0], virtual_devices)
+    cls._strategy = tf.distribute.MirroredStrategy(
+        ['/cpu:%d' % i for i in range(4)])
+
+  def tearDown(self):
+    super().tearDown()
+    list(self._reset_pool.map(self._client.reset, _TABLES))
+
+  @classmethod
+  def tearDownClass(cls):
+    cls._reset_pool.shutdown()
+    super().tearDownClass()
+
+  @classmethod
+  def _populate_replay(cls,
+                       sequence_length=100,
+                       max_time_steps=None,
+                       tables=_TABLES):
+    max_time_steps = max_time_steps or sequence_length
+    # The writer copies the data so the same step can be appended every time.
+    step = [np.zeros((3, 3), dtype=np.float32)]
+    # Items are created after every 5th step once at least `sequence_length`
+    # steps have been written.
+    first_item_step = sequence_length + (-sequence_length) % 5
+    with cls._client.writer(max_time_steps) as writer:
+      num_appended = 0
+      for i in range(first_item_step, 1000, 5):
+        for _ in range(i + 1 - num_appended):
+          writer.append(step)
+        num_appended = i + 1
+        cls._create_items(writer, sequence_length, tables)
+      for _ in range(1000 - num_appended):
+        writer.append(step)
+
+  @staticmethod
+  def _create_items(writer, num_timesteps, tables):
+    for table in tables:
+      writer.create_item(table=table, num_timesteps=num_timesteps, priority=1)
+
+  def _sample_from(self, dataset, num_samples, batched=True, prefetch=True):
+    if prefetch:
+      # Overlap the sampling from the server with the evaluation.
+      dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+    if not batched:
+      iterator = dataset.make_initializable_iterator()
+      dataset_item = iterator.get_next()
+      self.evaluate(iterator.initializer)
+      return [self.evaluate(dataset_item) for _ in range(num_samples)]
+
+    # Fetch all the samples with a single `evaluate` and split them afterwards.
+    # The remainder is dropped so that running out of samples raises
+    # `OutOfRangeError` just like evaluating them one by one does.
+    iterator = dataset.take(num_samples).batch(
+        num_samples, drop_remainder=True).make_initializable_iterator()
+    batch = iterator.get_next()
+    self.evaluate(iterator.initializer)
+    batch = self.evaluate(batch)
+    return [
+        tree.map_structure(lambda x, i=i: x[i], batch)
+        for i in range(num_samples)
+    ]
+
+  def test_iterate(self):
     dataset = reverb_dataset.ReplayDataset(
         tf.constant(self._client.server_address),
-        table=tf.constant('dist'),
-        dtypes=(tf.float32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        table=tf.constant('populated_dist'),
+        dtypes=_F32,
+        shapes=_SHAPE_3X3,
         max_in_flight_samples_per_worker=100,
         flexible_batch_size=2)
     got = self._sample_from(dataset, 10)
@@ -205,31 +342,47 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
       self.assertIsInstance(sample, replay_sample.ReplaySample)
       # A single sample is returned so the key should be a scalar int64.
       self.assertIsInstance(sample.info.key, np.uint64)
-      np.testing.assert_array_equal(sample.data[0],
-                                    np.zeros((3, 3), dtype=np.float32))
+      _assert_array_equal(sample.data[0], np.zeros((3, 3), dtype=np.float32))
 
-  def test_distribution_strategy(self):
-    self._populate_replay()
+  def test_from_flat_spec(self):
+    dataset = reverb_dataset.ReplayDataset.from_flat_spec(
+        self._client.server_address,
+        table='populated_dist',
+        flat_dtypes=[tf.float32],
+        flat_shapes=[tf.TensorShape([3, 3])],
+        max_in_flight_samples_per_worker=100)
+    want = reverb_dataset.ReplayDataset(
+        self._client.server_address,
+        table='dist',
+        dtypes=_F32,
+        shapes=_SHAPE_3X3,
+        max_in_flight_samples_per_worker=100)
+    self.assertEqual(dataset.element_spec, want.element_spec)
 
-    physical_devices = tf.config.list_physical_devices('CPU')
+    got = self._sample_from(dataset, 10)
+    for sample in got:
+      self.assertIsInstance(sample, replay_sample.ReplaySample)
+      _assert_array_equal(sample.data[0], np.zeros((3, 3), dtype=np.float32))
 
-    configs = tf.config.experimental.get_virtual_device_configuration(
-        physical_devices[0])
-    if configs is None:
-      virtual_devices = [tf.config.experimental.VirtualDeviceConfiguration()
-                         for _ in range(4)]
-      tf.config.experimental.set_virtual_device_configuration(
-          physical_devices[0], virtual_devices)
+  def test_from_flat_spec_length_mismatch(self):
+    with self.assertRaisesRegex(ValueError, r'must have the same length'):
+      reverb_dataset.ReplayDataset.from_flat_spec(
+          self._client.server_address,
+          table='dist',
+          flat_dtypes=[tf.float32, tf.int32],
+          flat_shapes=[tf.TensorShape([3, 3])],
+          max_in_flight_samples_per_worker=100)
 
-    strategy = tf.distribute.MirroredStrategy(['/cpu:%d' % i for i in range(4)])
+  def test_distribution_strategy(self):
+    strategy = self._strategy
 
     def reverb_dataset_fn(i):
       tf.print('Creating dataset for replica; index:', i)
       return reverb_dataset.ReplayDataset(
           self._client.server_address,
-          table=tf.constant('dist'),
-          dtypes=(tf.float32,),
-          shapes=(tf.TensorShape([3, 3]),),
+          table=tf.constant('populated_dist'),
+          dtypes=_F32,
+          shapes=_SHAPE_3X3,
           max_in_flight_samples_per_worker=100).take(2)
 
     def dataset_fn(_):
@@ -273,8 +426,8 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
       reverb_dataset.ReplayDataset(
           self._client.server_address,
           table='dist',
-          dtypes=(tf.float32,),
-          shapes=(tf.TensorShape([3, 3]),),
+          dtypes=_F32,
+          shapes=_SHAPE_3X3,
           rate_limiter_timeout_ms=-2,
           max_in_flight_samples_per_worker=100)
 
@@ -283,31 +436,31 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     dataset_0s = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table='dist',
-        dtypes=(tf.float32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        dtypes=_F32,
+        shapes=_SHAPE_3X3,
         rate_limiter_timeout_ms=0,
         max_in_flight_samples_per_worker=100)
 
     dataset_1s = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table='dist',
-        dtypes=(tf.float32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        dtypes=_F32,
+        shapes=_SHAPE_3X3,
         rate_limiter_timeout_ms=1000,
         max_in_flight_samples_per_worker=100)
 
     dataset_2s = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table='dist',
-        dtypes=(tf.float32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        dtypes=_F32,
+        shapes=_SHAPE_3X3,
         rate_limiter_timeout_ms=2000,
         max_in_flight_samples_per_worker=100)
 
     start_time = time.time()
     with self.assertRaisesWithPredicateMatch(tf.errors.OutOfRangeError,
                                              r'End of sequence'):
-      self._sample_from(dataset_0s, 1)
+      self._sample_from(dataset_0s, 1, batched=False, prefetch=False)
     duration = time.time() - start_time
     self.assertGreaterEqual(duration, 0)
     self.assertLess(duration, 5)
@@ -315,7 +468,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     start_time = time.time()
     with self.assertRaisesWithPredicateMatch(tf.errors.OutOfRangeError,
                                              r'End of sequence'):
-      self._sample_from(dataset_1s, 1)
+      self._sample_from(dataset_1s, 1, batched=False, prefetch=False)
     duration = time.time() - start_time
     self.assertGreaterEqual(duration, 1)
     self.assertLess(duration, 10)
@@ -323,7 +476,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     start_time = time.time()
     with self.assertRaisesWithPredicateMatch(tf.errors.OutOfRangeError,
                                              r'End of sequence'):
-      self._sample_from(dataset_2s, 1)
+      self._sample_from(dataset_2s, 1, batched=False, prefetch=False)
     duration = time.time() - start_time
     self.assertGreaterEqual(duration, 2)
     self.assertLess(duration, 10)
@@ -334,10 +487,9 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     got = self._sample_from(dataset_0s, 2)
     self.assertLen(got, 2)
 
-  @parameterized.parameters(['signatured'], ['bounded_spec_signatured'])
+  @parameterized.parameters(['populated_signatured'],
+                            ['populated_bounded_spec_signatured'])
   def test_inconsistent_signature_size(self, table_name):
-    self._populate_replay()
-
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
@@ -351,14 +503,14 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
             table_name)):
       self._sample_from(dataset, 10)
 
-  @parameterized.parameters(['signatured'], ['bounded_spec_signatured'])
+  @parameterized.parameters(['populated_signatured'],
+                            ['populated_bounded_spec_signatured'])
   def test_incompatible_signature_dtype(self, table_name):
-    self._populate_replay()
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
         dtypes=(tf.int64,),
-        shapes=(tf.TensorShape([3, 3]),),
+        shapes=_SHAPE_3X3,
         max_in_flight_samples_per_worker=100)
     with self.assertRaisesWithPredicateMatch(
         tf.errors.InvalidArgumentError,
@@ -381,14 +533,13 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
         r'Signature \(dtype, shape\): \(float, \[\?,\?\]\)'.format(table_name)):
       self._sample_from(dataset_emit_sequences, 10)
 
-  @parameterized.parameters(['signatured'], ['bounded_spec_signatured'])
+  @parameterized.parameters(['populated_signatured'],
+                            ['populated_bounded_spec_signatured'])
   def test_incompatible_signature_shape(self, table_name):
-    self._populate_replay()
-
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
-        dtypes=(tf.float32,),
+        dtypes=_F32,
         shapes=(tf.TensorShape([3]),),
         max_in_flight_samples_per_worker=100)
     with self.assertRaisesWithPredicateMatch(
@@ -401,7 +552,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     dataset_emit_sequences = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
-        dtypes=(tf.float32,),
+        dtypes=_F32,
         shapes=(tf.TensorShape([None, 3]),),
         emit_timesteps=False,
         max_in_flight_samples_per_worker=100)
@@ -418,18 +569,17 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
       reverb_dataset.ReplayDataset(
           self._client.server_address,
           table='dist',
-          dtypes=(tf.float32,),
+          dtypes=_F32,
           shapes=(tf.TensorShape([sequence_length + 1, 3, 3]),),
           emit_timesteps=False,
           sequence_length=sequence_length,
           max_in_flight_samples_per_worker=100)
 
   def test_incompatible_dataset_shapes_and_types_without_signature(self):
-    self._populate_replay()
     ds_wrong_shape = reverb_dataset.ReplayDataset(
         self._client.server_address,
-        table='dist',
-        dtypes=(tf.float32,),
+        table='populated_dist',
+        dtypes=_F32,
         shapes=(tf.TensorShape([]),),
         max_in_flight_samples_per_worker=100)
     with self.assertRaisesRegex(
@@ -440,8 +590,8 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
 
     ds_full_sequences_wrong_shape = reverb_dataset.ReplayDataset(
         self._client.server_address,
-        table='dist',
-        dtypes=(tf.float32,),
+        table='populated_dist',
+        dtypes=_F32,
         shapes=(tf.TensorShape([None]),),
         emit_timesteps=False,
         max_in_flight_samples_per_worker=100)
@@ -477,7 +627,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
-        dtypes=(tf.float32,),
+        dtypes=_F32,
         shapes=(tf.TensorShape([sequence_length, 3, 3]),),
         emit_timesteps=False,
         sequence_length=sequence_length,
@@ -489,7 +639,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
 
       # The keys and data should be batched up by the sequence length.
       self.assertEqual(sample.info.key.shape, (sequence_length,))
-      np.testing.assert_array_equal(
+      _assert_array_equal(
           sample.data[0], np.zeros((sequence_length, 3, 3), dtype=np.float32))
 
   @parameterized.parameters(
@@ -510,7 +660,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
-        dtypes=(tf.float32,),
+        dtypes=_F32,
         shapes=(tf.TensorShape([None, 3, 3]),),
         emit_timesteps=False,
         sequence_length=None,
@@ -529,7 +679,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
 
       # The keys and data should be batched up by the sequence length.
       self.assertEqual(sample.info.key.shape, (sequence_length,))
-      np.testing.assert_array_equal(
+      _assert_array_equal(
           sample.data[0], np.zeros((sequence_length, 3, 3), dtype=np.float32))
 
   @parameterized.parameters(
@@ -547,7 +697,7 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
-        dtypes=(tf.float32,),
+        dtypes=_F32,
         shapes=(tf.TensorShape([provided_sequence_length, 3, 3]),),
         emit_timesteps=True,
         sequence_length=provided_sequence_length,
@@ -557,45 +707,44 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
       self._sample_from(dataset, 10)
 
   @parameterized.named_parameters(
-      dict(testcase_name='TableDist', table_name='dist'),
-      dict(testcase_name='TableSignatured', table_name='signatured'),
+      dict(testcase_name='TableDist', table_name='populated_dist'),
+      dict(testcase_name='TableSignatured', table_name='populated_signatured'),
       dict(
           testcase_name='TableBoundedSpecSignatured',
-          table_name='bounded_spec_signatured'))
+          table_name='populated_bounded_spec_signatured'))
   def test_iterate_batched(self, table_name):
-    self._populate_replay()
-
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table=table_name,
-        dtypes=(tf.float32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        dtypes=_F32,
+        shapes=_SHAPE_3X3,
         max_in_flight_samples_per_worker=100)
     dataset = dataset.batch(2, True)
 
     got = self._sample_from(dataset, 10)
+    want = np.zeros((2, 3, 3), dtype=np.float32)
     for sample in got:
       self.assertIsInstance(sample, replay_sample.ReplaySample)
 
       # The keys should be batched up like the data.
       self.assertEqual(sample.info.key.shape, (2,))
 
-      np.testing.assert_array_equal(sample.data[0],
-                                    np.zeros((2, 3, 3), dtype=np.float32))
+      _assert_array_equal(sample.data[0], want)
 
   def test_iterate_nested_and_batched(self):
+    step = {
+        'observation': {
+            'data': np.zeros((3, 3), dtype=np.float32),
+            'extras': [
+                np.int64(10),
+                np.ones([1], dtype=np.int32),
+            ],
+        },
+        'reward': np.zeros((10, 10), dtype=np.float32),
+    }
     with self._client.writer(100) as writer:
       for i in range(1000):
-        writer.append({
-            'observation': {
-                'data': np.zeros((3, 3), dtype=np.float32),
-                'extras': [
-                    np.int64(10),
-                    np.ones([1], dtype=np.int32),
-                ],
-            },
-            'reward': np.zeros((10, 10), dtype=np.float32),
-        })
+        writer.append(step)
         if i % 5 == 0 and i >= 100:
           writer.create_item(
               table='dist', num_timesteps=100, priority=1)
@@ -610,32 +759,22 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
         max_in_flight_samples_per_worker=100)
     dataset = dataset.batch(3)
 
-    structure = {
-        'observation': {
-            'data':
-                tf.TensorSpec([3, 3], tf.float32),
-            'extras': [
-                tf.TensorSpec([], tf.int64),
-                tf.TensorSpec([1], tf.int32),
-            ],
-        },
-        'reward': tf.TensorSpec([], tf.int64),
-    }
-
     got = self._sample_from(dataset, 10)
     self.assertLen(got, 10)
+    want_data = np.zeros([3, 3, 3], dtype=np.float32)
+    want_extras_0 = np.ones([3], dtype=np.int64) * 10
+    want_extras_1 = np.ones([3, 1], dtype=np.int32)
+    want_reward = np.zeros([3, 10, 10], dtype=np.float32)
     for sample in got:
       self.assertIsInstance(sample, replay_sample.ReplaySample)
 
-      transition = tree.unflatten_as(structure, tree.flatten(sample.data))
-      np.testing.assert_array_equal(transition['observation']['data'],
-                                    np.zeros([3, 3, 3], dtype=np.float32))
-      np.testing.assert_array_equal(transition['observation']['extras'][0],
-                                    np.ones([3], dtype=np.int64) * 10)
-      np.testing.assert_array_equal(transition['observation']['extras'][1],
-                                    np.ones([3, 1], dtype=np.int32))
-      np.testing.assert_array_equal(transition['reward'],
-                                    np.zeros([3, 10, 10], dtype=np.float32))
+      # `sample.data` has the structure of `dtypes`, i.e
+      # ((data, (extras_0, extras_1)), reward).
+      (data, (extras_0, extras_1)), reward = sample.data
+      _assert_array_equal(data, want_data)
+      _assert_array_equal(extras_0, want_extras_0)
+      _assert_array_equal(extras_1, want_extras_1)
+      _assert_array_equal(reward, want_reward)
 
   def test_multiple_iterators(self):
     with self._client.writer(100) as writer:
@@ -649,25 +788,29 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
     dataset = reverb_dataset.ReplayDataset(
         self._client.server_address,
         table='dist',
-        dtypes=(tf.float32,),
-        shapes=(tf.TensorShape([81, 81]),),
+        dtypes=_F32,
+        shapes=_SHAPE_81X81,
         max_in_flight_samples_per_worker=100)
     dataset = dataset.batch(trajectory_length)
 
-    iterators = [
-        dataset.make_initializable_iterator() for _ in range(batch_size)
-    ]
-    items = tf.stack(
-        [tf.squeeze(iterator.get_next().data) for iterator in iterators])
+    # Each of the interleaved datasets is iterated by its own iterator so this
+    # still reads `dataset` through `batch_size` independent iterators.
+    items = tf.data.Dataset.range(batch_size).interleave(
+        lambda _: dataset.take(1),
+        cycle_length=batch_size,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE).batch(batch_size)
+    iterator = items.make_initializable_iterator()
+    item = iterator.get_next()
 
     with self.session() as session:
-      session.run([iterator.initializer for iterator in iterators])
-      got = session.run(items)
+      session.run(iterator.initializer)
+      got = session.run(item.data[0])
       self.assertEqual(got.shape, (batch_size, trajectory_length, 81, 81))
 
-      want = np.array(
-          [[np.ones([81, 81]) * i for i in range(trajectory_length)]] *
-          batch_size)
+      # Step `i` of every trajectory is filled with the value `i`.
+      want = np.broadcast_to(
+          np.arange(trajectory_length, dtype=np.float32)[None, :, None, None],
+          (batch_size, trajectory_length, 81, 81))
       np.testing.assert_array_equal(got, want)
 
   def test_iterate_over_blobs(self):
@@ -678,17 +821,17 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
         self._client.server_address,
         table='dist',
         dtypes=(tf.int32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        shapes=_SHAPE_3X3,
         max_in_flight_samples_per_worker=100)
 
     got = self._sample_from(dataset, 20)
     self.assertLen(got, 20)
+    want = np.ones((3, 3), dtype=np.int32)
     for sample in got:
       self.assertIsInstance(sample, replay_sample.ReplaySample)
       self.assertIsInstance(sample.info.key, np.uint64)
       self.assertIsInstance(sample.info.probability, np.float64)
-      np.testing.assert_array_equal(sample.data[0],
-                                    np.ones((3, 3), dtype=np.int32))
+      _assert_array_equal(sample.data[0], want)
 
   def test_iterate_over_batched_blobs(self):
     for _ in range(10):
@@ -698,18 +841,18 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
         self._client.server_address,
         table='dist',
         dtypes=(tf.int32,),
-        shapes=(tf.TensorShape([3, 3]),),
+        shapes=_SHAPE_3X3,
         max_in_flight_samples_per_worker=100)
 
     dataset = dataset.batch(5)
 
     got = self._sample_from(dataset, 20)
     self.assertLen(got, 20)
+    want = np.ones((5, 3, 3), dtype=np.int32)
     for sample in got:
       self.assertIsInstance(sample, replay_sample.ReplaySample)
       self.assertEqual(sample.info.key.shape, (5,))
-      np.testing.assert_array_equal(sample.data[0],
-                                    np.ones((5, 3, 3), dtype=np.int32))
+      _assert_array_equal(sample.data[0], want)
 
   def test_converts_spec_lists_into_tuples(self):
     for _ in range(10):
@@ -782,6 +925,10 @@ class ReplayDatasetTest(tf.test.TestCase, parameterized.TestCase):
 
 class FromTableSignatureTest(tf.test.TestCase):
 
+  def setUp(self):
+    super().setUp()
+    reverb_dataset.reset_signature_cache()
+
   def test_table_not_found(self):
     server = reverb_server.Server([
         reverb_server.Table.queue('table_a', 10),
@@ -797,50 +944,58 @@ class FromTableSignatureTest(tf.test.TestCase):
       reverb_dataset.ReplayDataset.from_table_signature(
           address, 'not_found', 100)
 
+  def test_table_not_found_truncates_table_names(self):
+    server = reverb_server.Server([
+        reverb_server.Table.queue(f'table_{i:02d}', 10) for i in range(40)
+    ])
+    self.addCleanup(server.stop)
+    address = f'localhost:{server.port}'
+    names = ', '.join(f'table_{i:02d}' for i in range(32))
+
+    with self.assertRaisesWithPredicateMatch(
+        ValueError,
+        re.escape(
+            f'Server at {address} does not contain any table named not_found. '
+            f'Found: {names} (+8 more).')):
+      reverb_dataset.ReplayDataset.from_table_signature(
+          address, 'not_found', 100)
+
   def test_server_not_found(self):
     with self.assertRaises(errors.DeadlineExceededError):
       reverb_dataset.ReplayDataset.from_table_signature(
           'localhost:1234', 'not_found', 100, get_signature_timeout_secs=1)
 
   def test_table_does_not_have_signature(self):
-    server = make_server()
-    address = f'localhost:{server.port}'
+    address = f'localhost:{_signature_server().port}'
     with self.assertRaisesWithPredicateMatch(
-        ValueError, f'Table dist at {address} does not have a signature.'):
+        ValueError,
+        f'Table no_signature at {address} does not have a signature.'):
       reverb_dataset.ReplayDataset.from_table_signature(
-          address, 'dist', 100)
+          address, 'no_signature', 100)
 
   def test_sets_dtypes_from_signature(self):
-    signature = {
-        'a': {
-            'b': tf.TensorSpec([3, 3], tf.float32),
-            'c': tf.TensorSpec([], tf.int64),
-        },
-        'x': tf.TensorSpec([None], tf.uint64),
-    }
+    dataset = reverb_dataset.ReplayDataset.from_table_signature(
+        f'localhost:{_signature_server().port}', 'signatured', 100)
+    self.assertDictEqual(dataset.element_spec.data,
+                         _SIGNATURES['signatured'])
 
+  def test_caches_signature(self):
+    signature = {'a': tf.TensorSpec([3, 3], tf.float32)}
     server = reverb_server.Server(
         [reverb_server.Table.queue('queue', 10, signature=signature)])
+    address = f'localhost:{server.port}'
 
+    reverb_dataset.ReplayDataset.from_table_signature(address, 'queue', 100)
+
+    # The signature is served from the cache so the server is no longer needed.
+    server.stop()
     dataset = reverb_dataset.ReplayDataset.from_table_signature(
-        f'localhost:{server.port}', 'queue', 100)
+        address, 'queue', 100)
     self.assertDictEqual(dataset.element_spec.data, signature)
 
   def test_sets_dtypes_from_bounded_spec_signature(self):
-    bounded_spec_signature = {
-        'a': {
-            'b': tensor_spec.BoundedTensorSpec([3, 3], tf.float32, 0, 3),
-            'c': tensor_spec.BoundedTensorSpec([], tf.int64, 0, 5),
-        },
-    }
-
-    server = reverb_server.Server([
-        reverb_server.Table.queue(
-            'queue', 10, signature=bounded_spec_signature)
-    ])
-
     dataset = reverb_dataset.ReplayDataset.from_table_signature(
-        f'localhost:{server.port}', 'queue', 100)
+        f'localhost:{_signature_server().port}', 'bounded_spec_signatured', 100)
     self.assertDictEqual(
         dataset.element_spec.data, {
             'a': {
@@ -850,21 +1005,9 @@ class FromTableSignatureTest(tf.test.TestCase):
         })
 
   def test_combines_sequence_length_with_signature_if_not_emit_timestamps(self):
-    server = reverb_server.Server([
-        reverb_server.Table.queue(
-            'queue',
-            10,
-            signature={
-                'a': {
-                    'b': tf.TensorSpec([3, 3], tf.float32),
-                    'c': tf.TensorSpec([], tf.int64),
-                },
-            })
-    ])
-
     dataset = reverb_dataset.ReplayDataset.from_table_signature(
-        f'localhost:{server.port}',
-        'queue',
+        f'localhost:{_signature_server().port}',
+        'sequence_signatured',
         100,
         emit_timesteps=False,
         sequence_length=5)
@@ -877,6 +1020,43 @@ class FromTableSignatureTest(tf.test.TestCase):
         })
 
 
+_Point = collections.namedtuple('_Point', ['x', 'y'])
+
+
+class ConvertListsToTuplesTest(tf.test.TestCase):
+
+  def test_returns_structure_without_lists_as_is(self):
+    point = _Point(x=(1, 2), y={'a': 3})
+    structure = {'a': (1, point), 'b': collections.OrderedDict(c=4)}
+    got = reverb_dataset._convert_lists_to_tuples(structure)  # pylint: disable=protected-access
+    self.assertIs(got, structure)
+
+  def test_converts_lists_in_namedtuples(self):
+    got = reverb_dataset._convert_lists_to_tuples(  # pylint: disable=protected-access
+        _Point(x=[1, [2]], y=3))
+    self.assertIsInstance(got, _Point)
+    self.assertEqual(got, _Point(x=(1, (2,)), y=3))
+
+  def test_converts_lists_in_mappings(self):
+    structure = collections.OrderedDict([('b', [1, 2]), ('a', {'c': [3]})])
+    got = reverb_dataset._convert_lists_to_tuples(structure)  # pylint: disable=protected-access
+    self.assertIsInstance(got, collections.OrderedDict)
+    self.assertEqual(list(got.items()), [('b', (1, 2)), ('a', {'c': (3,)})])
+
+  def test_converts_lists_in_defaultdicts(self):
+    structure = collections.defaultdict(list, {'a': [1, 2]})
+    got = reverb_dataset._convert_lists_to_tuples(structure)  # pylint: disable=protected-access
+    self.assertIsInstance(got, collections.defaultdict)
+    self.assertIs(got.default_factory, list)
+    self.assertEqual(dict(got), {'a': (1, 2)})
+
+  def test_keeps_unchanged_subtrees(self):
+    unchanged = (1, {'a': 2})
+    got = reverb_dataset._convert_lists_to_tuples([unchanged, [3]])  # pylint: disable=protected-access
+    self.assertEqual(got, (unchanged, (3,)))
+    self.assertIs(got[0], unchanged)
+
+
 if __name__ == '__main__':
   tf.disable_eager_execution()
   tf.test.main()